@@ -35,5 +35,6 @@ setup(
         "deprecated",
         "coreapi",
     ],
+    extras_require={"isal": ["isal"], "cryptography": ["cryptography"]},
     classifiers=["Framework :: Pytest"],
 )
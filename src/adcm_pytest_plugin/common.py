@@ -11,11 +11,18 @@
 # limitations under the License.
 """Common methods and classes"""
 
+from concurrent.futures import ThreadPoolExecutor
+from itertools import product
+
 import allure
 import pytest
 
 from .utils import get_data_dir
 
+LAYER_UI = pytest.mark.allure_label("UI", label_type="layer")
+LAYER_API = pytest.mark.allure_label("API", label_type="layer")
+LAYER_UNIT = pytest.mark.allure_label("Unit", label_type="layer")
+
 
 class Layer:  # pylint: disable=too-few-public-methods
     """
@@ -32,9 +39,9 @@ class Layer:  # pylint: disable=too-few-public-methods
             pass
     """
 
-    UI = pytest.mark.allure_label("UI", label_type="layer")
-    API = pytest.mark.allure_label("API", label_type="layer")
-    Unit = pytest.mark.allure_label("Unit", label_type="layer")
+    UI = LAYER_UI
+    API = LAYER_API
+    Unit = LAYER_UNIT
 
 
 @allure.title("Add dummy objects to ADCM")
@@ -44,20 +51,20 @@ def add_dummy_objects_to_adcm(adcm_client):
         provider_bundle = adcm_client.upload_from_fs(get_data_dir(__file__, "provider"))
         provider = provider_bundle.provider_prototype().provider_create(name="Pre-uploaded provider")
         second_provider = provider_bundle.provider_prototype().provider_create(name="Pre-uploaded second provider")
-        _ = [second_provider.host_create(fqdn=f"pre-uploaded-host-second-provider-{i}") for i in range(6)]
+        _create_hosts(second_provider, "pre-uploaded-host-second-provider")
     with allure.step("Create cluster for the further import and add hosts to it"):
         cluster_to_import_bundle = adcm_client.upload_from_fs(get_data_dir(__file__, "cluster_to_import"))
         cluster_to_import = cluster_to_import_bundle.cluster_prototype().cluster_create(
             name="Pre-uploaded cluster for the import"
         )
-        for i in range(6):
-            cluster_to_import.host_add(provider.host_create(fqdn=f"pre-uploaded-host-import-{i}"))
+        for host in _create_hosts(provider, "pre-uploaded-host-import"):
+            cluster_to_import.host_add(host)
     with allure.step("Create a cluster with service"):
         cluster_bundle = adcm_client.upload_from_fs(get_data_dir(__file__, "cluster_with_service"))
         cluster = cluster_bundle.cluster_prototype().cluster_create(name="Pre-uploaded cluster with services")
         cluster.bind(cluster_to_import)
     with allure.step("Create hosts and add them to cluster"):
-        hosts = tuple((cluster.host_add(provider.host_create(fqdn=f"pre-uploaded-host-{i}")) for i in range(6)))
+        hosts = tuple(cluster.host_add(host) for host in _create_hosts(provider, "pre-uploaded-host"))
     with allure.step("Add services"):
         service_first = cluster.service_add(name="First service")
         service_second = cluster.service_add(name="Second service")
@@ -67,7 +74,13 @@ def add_dummy_objects_to_adcm(adcm_client):
             service_second.component(name="third"),
         )
     with allure.step("Add hosts to cluster and set hostcomponent map"):
-        cluster.hostcomponent_set(*[(host, component) for host in hosts for component in components])
+        cluster.hostcomponent_set(*product(hosts, components))
     with allure.step("Run task"):
         task = cluster.action(name="action_on_cluster").run()
         task.wait()
+
+
+def _create_hosts(provider, fqdn_prefix: str, count: int = 6) -> list:
+    """Create hosts concurrently, hosts are returned in the order of their fqdn suffixes"""
+    with ThreadPoolExecutor(max_workers=count) as executor:
+        return list(executor.map(lambda i: provider.host_create(fqdn=f"{fqdn_prefix}-{i}"), range(count)))
@@ -12,6 +12,8 @@
 
 """Custom types for usage in pytest and allure"""
 
+from collections import deque
+
 import pytest
 
 
@@ -23,27 +25,46 @@ class SecureString(str):
     """
 
     def __new__(cls, value, *args, **kwargs):
+        secure_data = getattr(pytest, "secure_data", None)
+        if not isinstance(secure_data, set):
+            secure_data = pytest.secure_data = set()
+        secure_data.add(value)
         return super(SecureString, cls).__new__(cls, value)
 
-    # pylint: disable=super-init-not-called
-    def __init__(self, value, *args, **kwargs):
-        if hasattr(pytest, "secure_data") and isinstance(pytest.secure_data, set):
-            pytest.secure_data.add(value)
-        else:
-            pytest.secure_data = {
-                value,
-            }
-
     @staticmethod
     def make_all_nested_string_vals_secure(obj):
-        """Mask all occurances of sensitive string in dict and list objects"""
-        if isinstance(obj, str):
-            obj = SecureString(obj)
-        elif isinstance(obj, dict):
-            for key, value in obj.items():
-                obj[key] = SecureString.make_all_nested_string_vals_secure(value)
-        elif isinstance(obj, list):
-            obj = [SecureString(item) for item in obj]
+        """
+        Mask all occurances of sensitive string in dict and list objects
+        Nested dicts and lists are updated in place
+
+        >>> config = {"password": "secret", "hosts": ["first", {"token": "abc"}], "port": 8000}
+        >>> config = SecureString.make_all_nested_string_vals_secure(config)
+        >>> type(config["password"]).__name__, type(config["hosts"][1]["token"]).__name__, config["port"]
+        ('SecureString', 'SecureString', 8000)
+        >>> {"secret", "first", "abc"} <= pytest.secure_data
+        True
+        >>> password = SecureString("qwerty")
+        >>> SecureString.make_all_nested_string_vals_secure(password) is password
+        True
+        """
+        if isinstance(obj, str) and not isinstance(obj, SecureString):
+            return SecureString(obj)
+        nodes = deque([obj])
+        while nodes:
+            node = nodes.popleft()
+            if isinstance(node, dict):
+                items = node.items()
+            elif isinstance(node, list):
+                items = enumerate(node)
+            else:
+                continue
+            for key, value in items:
+                if isinstance(value, SecureString):
+                    continue
+                if isinstance(value, str):
+                    node[key] = SecureString(value)
+                elif isinstance(value, (dict, list)):
+                    nodes.append(value)
         return obj
 
 
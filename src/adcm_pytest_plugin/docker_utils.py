@@ -11,42 +11,82 @@
 # limitations under the License.
 """Utils of docker interaction"""
 
+import errno
+import functools
 import io
 import json
 import os
+import queue
+import random
 import re
+import selectors
+import shutil
 import socket
-import string
+import struct
 import tarfile
+import threading
+import time
 import warnings
+from concurrent.futures import ThreadPoolExecutor
 from contextlib import contextmanager, suppress
-from dataclasses import asdict, dataclass
-from gzip import compress
-from tempfile import TemporaryDirectory
-from typing import Generator, Optional, Tuple
+from dataclasses import dataclass, fields
+from pathlib import Path
+from tempfile import TemporaryDirectory, gettempdir
+from typing import Dict, Generator, Iterable, List, Optional, Tuple
+from urllib.parse import urlsplit
 
 import allure
 import docker
 import pytest
 import requests.exceptions
 from adcm_client.objects import ADCMClient
-from adcm_client.util.wait import wait_for_url
 from allure_commons.types import AttachmentType
 from coreapi.exceptions import ErrorMessage
 from docker import DockerClient
-from docker.errors import APIError, ImageNotFound, NotFound
+from docker.errors import APIError, NotFound
 from docker.models.containers import Container
 from docker.utils import parse_repository_tag
+from requests.adapters import HTTPAdapter
 from retry.api import retry_call
 
 from .common import add_dummy_objects_to_adcm
-from .utils import random_string
+from .utils import file_lock, generate_self_signed_cert, random_string
+
+try:
+    # ISA-L implementation of gzip is several times faster than zlib one
+    from isal.igzip import IGzipFile as GzipFile
+except ImportError:
+    from gzip import GzipFile
 
 MIN_DOCKER_PORT = 8000
 MAX_DOCKER_PORT = 9000
 DEFAULT_IP = "127.0.0.1"
 CONTAINER_START_RETRY_COUNT = 20
 MAX_WORKER_COUNT = 80
+PORT_PROBE_BATCH_SIZE = 32
+_PORTS_PER_WORKER = (MAX_DOCKER_PORT - MIN_DOCKER_PORT) // MAX_WORKER_COUNT
+# struct linger with l_onoff=1 and l_linger=0
+_LINGER_RESET = struct.pack("ii", 1, 0)
+PORT_PROBE_TIMEOUT = 0.5
+_COPY_BUFFER_SIZE = 1024 * 1024
+ARCHIVE_READ_AHEAD_CHUNKS = 8
+DOCKER_CLIENT_POOL_SIZE = 16
+IMAGE_EXISTS_CACHE_TTL = 300
+SKIP_PULL_IF_LOCAL_ENV = "ADCM_SKIP_PULL_IF_LOCAL"
+# lock file is per user: file of another user in sticky /tmp can't be opened for writing
+PORT_ALLOCATION_LOCK_FILE = os.path.join(gettempdir(), f"adcm_pytest_port_{os.getuid()}.lock")
+BATCH_EXEC_SEPARATOR = "===ADCM-SEP==="
+
+# clients are shared by every caller in the process, keyed by daemon URL (None stands for the one from env)
+_DOCKER_CLIENTS: Dict[Optional[str], DockerClient] = {}
+_DOCKER_CLIENTS_LOCK = threading.Lock()
+
+_PORT_ALLOCATION_LOCK = threading.Lock()
+
+# (docker daemon URL, repo, tag) -> monotonic time until which the image is known to exist
+_IMAGE_EXISTS_CACHE: Dict[Tuple[str, str, str], float] = {}
+
+_DOCKER_CGROUP_RE = re.compile(r"\d+:[\w=]+:/docker(-[ce]e)?/\w+")
 
 
 class UnableToBind(Exception):
@@ -57,39 +97,162 @@ class RetryCountExceeded(Exception):
     """Raise when container restart count is exceeded"""
 
 
-def _port_is_free(ip, port) -> bool:
-    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
-        return sock.connect_ex((ip, port)) != 0
+def _free_ports(ip, ports: range) -> List[int]:
+    """
+    Return ports from the given range that are free on ip.
+    Ports are checked with bind when ip belongs to this host and with connect otherwise (e.g. remote docker)
+    """
+    free = _bindable_ports(ip, ports)
+    return free if free is not None else _unreachable_ports(ip, ports)
+
+
+def _bindable_ports(ip, ports: range) -> Optional[List[int]]:
+    """
+    Return ports that can be bound on ip or None if ip isn't an address of this host.
+    Bind is answered by the kernel without any network exchange
+    """
+    free = []
+    for port in ports:
+        with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
+            # ports in TIME_WAIT state can be taken by docker, so they are considered free as well
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+            try:
+                sock.bind((ip, port))
+            except OSError as err:
+                if err.errno == errno.EADDRNOTAVAIL:
+                    return None
+                continue
+        free.append(port)
+    return free
+
+
+def _unreachable_ports(ip, ports: range) -> List[int]:
+    """
+    Probe ports with non-blocking connects issued at once and return the ones nobody listens on.
+    Port is considered free if connection to it failed or wasn't established within probe timeout
+    """
+    busy = set()
+    sockets = []
+    with selectors.DefaultSelector() as selector:
+        try:
+            for port in ports:
+                sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+                sockets.append(sock)
+                # connection is reset on close, so probes don't leave sockets in TIME_WAIT
+                sock.setsockopt(socket.SOL_SOCKET, socket.SO_LINGER, _LINGER_RESET)
+                sock.setblocking(False)
+                result = sock.connect_ex((ip, port))
+                if result == 0:
+                    busy.add(port)
+                elif result in (errno.EINPROGRESS, errno.EWOULDBLOCK):
+                    selector.register(sock, selectors.EVENT_WRITE, port)
+            deadline = time.monotonic() + PORT_PROBE_TIMEOUT
+            while selector.get_map() and (timeout := deadline - time.monotonic()) > 0:
+                for key, _ in selector.select(timeout):
+                    selector.unregister(key.fileobj)
+                    if key.fileobj.getsockopt(socket.SOL_SOCKET, socket.SO_ERROR) == 0:
+                        busy.add(key.data)
+        finally:
+            for sock in sockets:
+                sock.close()
+    return [port for port in ports if port not in busy]
+
+
+@functools.lru_cache(maxsize=None)
+def _worker_port_range(gw_name: str, gw_count: int) -> Tuple[int, int]:
+    """
+    Get start of ports range of xdist worker and the range length
+
+    >>> _worker_port_range("gw0", 0)
+    (8000, 12)
+    >>> _worker_port_range("gw2", 4)
+    (8024, 12)
+    """
+    if gw_count > MAX_WORKER_COUNT:
+        pytest.exit(f"Expected maximum workers count is {MAX_WORKER_COUNT}.")
+    # xdist names workers "gw0", "gw1", ...
+    gw_number = int(gw_name[2:])
+    return MIN_DOCKER_PORT + gw_number * _PORTS_PER_WORKER, _PORTS_PER_WORKER
 
 
 def _yield_ports(ip, port_from: int = 0) -> Generator[int, None, None]:
-    gw_count = os.environ.get("PYTEST_XDIST_WORKER_COUNT", 0)
-    if int(gw_count) > MAX_WORKER_COUNT:
-        pytest.exit("Expected maximum workers count is {MAX_WORKER_COUNT}.")
-    gw_name = os.environ.get("PYTEST_XDIST_WORKER", "gw0")
-    gw_number = int(gw_name.strip(string.ascii_letters))
-    range_length = (MAX_DOCKER_PORT - MIN_DOCKER_PORT) // MAX_WORKER_COUNT
-    offset = MIN_DOCKER_PORT + gw_number * range_length
+    offset, range_length = _worker_port_range(
+        os.environ.get("PYTEST_XDIST_WORKER", "gw0"), int(os.environ.get("PYTEST_XDIST_WORKER_COUNT", 0))
+    )
     range_start = max(port_from, offset)
-    for port in range(range_start, range_start + range_length):
-        if _port_is_free(ip, port):
-            yield port
+    range_end = range_start + range_length
+    for batch_start in range(range_start, range_end, PORT_PROBE_BATCH_SIZE):
+        yield from _free_ports(ip, range(batch_start, min(batch_start + PORT_PROBE_BATCH_SIZE, range_end)))
     raise UnableToBind("There is no free port for the given worker.")
 
 
+def get_docker_client(base_url: Optional[str] = None) -> DockerClient:
+    """
+    Get DockerClient shared within the process, so its connections pool is reused by all callers.
+    If no base_url passed use local docker socket or client configured from env if DOCKER_HOST is set
+    """
+    with _DOCKER_CLIENTS_LOCK:
+        if base_url not in _DOCKER_CLIENTS:
+            url = base_url or _local_docker_socket_url()
+            _DOCKER_CLIENTS[base_url] = (
+                docker.DockerClient(base_url=url, timeout=120, max_pool_size=DOCKER_CLIENT_POOL_SIZE)
+                if url
+                else docker.from_env(timeout=120, max_pool_size=DOCKER_CLIENT_POOL_SIZE)
+            )
+        return _DOCKER_CLIENTS[base_url]
+
+
+def _local_docker_socket_url() -> Optional[str]:
+    """
+    Get URL of the first existing local docker socket, None if DOCKER_HOST is set or no socket found.
+    Besides the default one, socket of Docker Desktop is checked
+    """
+    if os.environ.get("DOCKER_HOST"):
+        return None
+    for path in ("/var/run/docker.sock", os.path.expanduser("~/.docker/run/docker.sock")):
+        if os.path.exists(path):
+            return f"unix://{path}"
+    return None
+
+
+@functools.lru_cache(maxsize=1)
 def is_docker() -> bool:
     """
     Look into cgroup to detect if we are in container
+    The result is cached since it can't change during the process lifetime
     """
     path = "/proc/self/cgroup"
     try:
         with open(path, encoding="utf-8") as file:
-            for line in file:
-                if re.match(r"\d+:[\w=]+:/docker(-[ce]e)?/\w+", line):
-                    return True
+            data = file.read()
     except FileNotFoundError:
-        pass
-    return False
+        return False
+    # cheap substring check rejects the common case without parsing lines
+    return "/docker" in data and any(_is_docker_cgroup(line) for line in data.splitlines())
+
+
+def _is_docker_cgroup(line: str) -> bool:
+    """
+    Check if line of /proc/self/cgroup ("hierarchy-ID:controllers:path") points to docker cgroup
+
+    >>> _is_docker_cgroup("12:pids:/docker/3f2c1a9e")
+    True
+    >>> _is_docker_cgroup("1:name=systemd:/docker-ce/3f2c1a9e")
+    True
+    >>> _is_docker_cgroup("12:pids:/user.slice")
+    False
+    >>> _is_docker_cgroup("0::/docker/3f2c1a9e")
+    False
+    >>> _is_docker_cgroup("12:pids:/docker/\\n")
+    False
+    >>> _is_docker_cgroup("1:name=systemd:/docker/3f2c/init.scope")
+    True
+    >>> _is_docker_cgroup("12:pids:/docker/abc_123")
+    True
+    >>> _is_docker_cgroup("4:cpu,cpuacct:/docker/abc")
+    False
+    """
+    return _DOCKER_CGROUP_RE.match(line) is not None
 
 
 @contextmanager
@@ -100,11 +263,46 @@ def gather_adcm_data_from_container(adcm: "ADCM"):
     """
     bits, _ = adcm.container.get_archive("/adcm/data/")
 
+    # chunks are compressed as they arrive, so uncompressed archive is never held in memory
     with io.BytesIO() as stream:
-        for chunk in bits:
-            stream.write(chunk)
-        stream.seek(0)
-        yield compress(stream.getvalue())
+        with GzipFile(fileobj=stream, mode="wb", compresslevel=1) as gzip_file:
+            gzip_file.writelines(_read_ahead(bits, ARCHIVE_READ_AHEAD_CHUNKS))
+        yield stream.getvalue()
+
+
+def _read_ahead(chunks: Iterable[bytes], max_chunks: int) -> Generator[bytes, None, None]:
+    """
+    Iterate over chunks that are fetched by background thread, up to `max_chunks` ahead of consumer.
+    Lets download from Docker daemon overlap with processing (e.g. compression) of already received chunks
+    """
+    chunk_queue = queue.Queue(maxsize=max_chunks)
+    stopped = threading.Event()
+    errors = []
+
+    def fetch():
+        try:
+            for chunk in chunks:
+                if stopped.is_set():
+                    return
+                chunk_queue.put(chunk)
+        except Exception as err:  # pylint: disable=broad-except
+            errors.append(err)
+        finally:
+            chunk_queue.put(None)
+
+    thread = threading.Thread(target=fetch, daemon=True)
+    thread.start()
+    try:
+        while (chunk := chunk_queue.get()) is not None:
+            yield chunk
+    finally:
+        stopped.set()
+        # release the fetching thread in case consumer stopped before the end of stream
+        while thread.is_alive():
+            with suppress(queue.Empty):
+                chunk_queue.get(timeout=0.1)
+    if errors:
+        raise errors[0]
 
 
 def get_file_from_container(instance, path, filename):
@@ -122,12 +320,40 @@ def get_file_from_container(instance, path, filename):
     """
 
     stream = instance.container.get_archive(path + filename)[0]
-    file_obj = io.BytesIO()
-    for i in stream:
-        file_obj.write(i)
-    file_obj.seek(0)
-    with tarfile.open(mode="r", fileobj=file_obj) as tar:
-        return tar.extractfile(filename)
+    # archive is parsed while chunks arrive, only content of the requested file is kept in memory
+    # large bufsize lets tarfile pull data in few big reads instead of default 10 KiB records
+    with tarfile.open(mode="r|", fileobj=_ChunkReader(stream), bufsize=_COPY_BUFFER_SIZE) as tar:
+        for member in tar:
+            if member.name == filename:
+                file_obj = io.BytesIO()
+                shutil.copyfileobj(tar.extractfile(member), file_obj, _COPY_BUFFER_SIZE)
+                file_obj.seek(0)
+                return file_obj
+    raise KeyError(f"filename {filename!r} not found")
+
+
+class _ChunkReader(io.RawIOBase):
+    """Read-only raw stream over iterator of bytes chunks returned by Docker API"""
+
+    def __init__(self, chunks: Iterable[bytes]):
+        super().__init__()
+        self._chunks = iter(chunks)
+        self._chunk = memoryview(b"")
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, buffer) -> int:
+        """Copy bytes of the current chunk into buffer without building intermediate bytes objects"""
+        while not self._chunk:
+            chunk = next(self._chunks, None)
+            if chunk is None:
+                return 0
+            self._chunk = memoryview(chunk)
+        size = min(len(buffer), len(self._chunk))
+        buffer[:size] = self._chunk[:size]
+        self._chunk = self._chunk[size:]
+        return size
 
 
 # pylint: disable=too-many-instance-attributes,invalid-name
@@ -176,7 +402,7 @@ class ADCMInitializer:
         self.adcm_repo = self.container_config.image
         self.adcm_tag = self.container_config.tag
         self.pull = self.container_config.pull
-        self.dc = dc if dc else docker.from_env(timeout=120)
+        self.dc = dc if dc else get_docker_client()
         self.preupload_bundle_urls = preupload_bundle_urls
         self.adcm_api_credentials = adcm_api_credentials if adcm_api_credentials else {}
         self.fill_dummy_data = fill_dummy_data
@@ -220,6 +446,7 @@ class ADCMInitializer:
         if self.preupload_bundle_urls:
             with allure.step("Pre-upload bundles into ADCM before image initialization"):
                 self._init_adcm_cli()
+                # bundles are loaded one by one: ADCM bundle loader uses global stage tables
                 for url in self.preupload_bundle_urls:
                     retry_call(
                         self._upload_bundle,
@@ -250,19 +477,15 @@ class ADCMInitializer:
             return
         self._certs_tmpdir = TemporaryDirectory()  # pylint: disable=consider-using-with
         tmpdir = self._certs_tmpdir.name
-        os.system(
-            f"openssl req -x509 -newkey rsa:4096 -keyout {tmpdir}/key.pem -out {tmpdir}/cert.pem"
-            ' -days 365 -subj "/C=RU/ST=Moscow/L=Moscow/O=Arenadata Software LLC/OU=Release/CN=ADCM"'
-            f' -addext "subjectAltName=DNS:localhost,IP:127.0.0.1,IP:{self._adcm.container_config.bind_ip}" -nodes'
-        )
+        generate_self_signed_cert(tmpdir, self._adcm.container_config.bind_ip)
         file = io.BytesIO()
-        with tarfile.open(mode="w:gz", fileobj=file) as tar:
+        # a few KB of certificates are not worth compressing, daemon accepts plain tar as well
+        with tarfile.open(mode="w", fileobj=file) as tar:
             tar.add(tmpdir, "")
-        file.seek(0)
-        self._adcm.container.put_archive("/adcm/data/conf/ssl", file.read())
+        self._adcm.container.put_archive("/adcm/data/conf/ssl", file.getvalue())
 
         bundle_path = os.path.join(tmpdir, "bundle.pem")
-        os.system(f"cat {tmpdir}/cert.pem {tmpdir}/key.pem > {bundle_path}")
+        Path(bundle_path).write_bytes(Path(tmpdir, "cert.pem").read_bytes() + Path(tmpdir, "key.pem").read_bytes())
         os.environ["REQUESTS_CA_BUNDLE"] = bundle_path
 
     def cleanup(self):
@@ -274,17 +497,30 @@ class ADCMInitializer:
 def image_exists(repo: str, tag: str, dc: Optional[DockerClient] = None):
     """
     Check if docker image exists in the given DockerClient
-    If no DockerClient passed use one from env
+    If no DockerClient passed use the shared one from env.
+    Only positive answers are cached (for IMAGE_EXISTS_CACHE_TTL seconds),
+    so the image built right after a miss is found by the next call
     """
     if dc is None:
-        dc = docker.from_env(timeout=120)
-    try:
-        dc.images.get(name=f"{repo}:{tag}")
-    except ImageNotFound:
+        dc = get_docker_client()
+    key = (dc.api.base_url, repo, tag)
+    if _IMAGE_EXISTS_CACHE.get(key, 0) > time.monotonic():
+        return True
+    reference = f"{repo}@{tag}" if tag.startswith("sha256:") else f"{repo}:{tag}"
+    # low-level listing returns just ids, unlike images.get/images.list that inspect every image found
+    if not dc.api.images(name=reference, quiet=True):
+        _IMAGE_EXISTS_CACHE.pop(key, None)
         return False
+    _IMAGE_EXISTS_CACHE[key] = time.monotonic() + IMAGE_EXISTS_CACHE_TTL
     return True
 
 
+def invalidate_image_exists_cache(repo: str, tag: str) -> None:
+    """Forget cached existence of the image for all docker daemons"""
+    for key in [key for key in _IMAGE_EXISTS_CACHE if key[1:] == (repo, tag)]:
+        _IMAGE_EXISTS_CACHE.pop(key, None)
+
+
 def split_tag(image_name: str):
     """
     Split docker image name
@@ -302,10 +538,42 @@ def split_tag(image_name: str):
     return parse_repository_tag(image_name)
 
 
+def _wait_for_url(url: str, timeout: int) -> bool:
+    """
+    Poll url until it responds, return False if there was no response in `timeout` seconds.
+    HTTP request is sent only after plain TCP connect to the port succeeds.
+    Server errors (e.g. 502 from proxy while backend is starting) are not treated as response.
+    Probes reuse a keep-alive connection and are spaced with jittered exponential backoff,
+    so parallel workers don't poll in sync.
+    """
+    address = urlsplit(url)
+    host, port = address.hostname, address.port or (443 if address.scheme == "https" else 80)
+    deadline = time.monotonic() + timeout
+    delay = 0.05
+    with requests.Session() as session:
+        session.mount("http://", HTTPAdapter(pool_connections=1, pool_maxsize=1))
+        while time.monotonic() < deadline:
+            if _accepts_connections(host, port):
+                try:
+                    if session.get(url, timeout=1).status_code < 500:
+                        return True
+                except requests.exceptions.RequestException:
+                    pass
+            time.sleep(delay + random.uniform(0, delay))
+            delay = min(delay * 2, 1.0)
+    return False
+
+
+def _accepts_connections(host: str, port: int) -> bool:
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
+        sock.settimeout(0.1)
+        return sock.connect_ex((host, port)) == 0
+
+
 def _wait_for_adcm_container_init(container, container_ip, port, timeout=300):
     adcm_api_url = f"http://{container_ip}:{port}/api/v1/"
     with allure.step(f"Waiting for ADCM API on {adcm_api_url}"):
-        if not wait_for_url(adcm_api_url, timeout):
+        if not _wait_for_url(adcm_api_url, timeout):
             additional_message = ""
             try:
                 container.kill()
@@ -360,14 +628,14 @@ class DockerWrapper:  # pylint: disable=too-few-public-methods
     __slots__ = ("client",)
 
     def __init__(self, base_url="unix://var/run/docker.sock", dc=None):
-        self.client = dc if dc else docker.DockerClient(base_url=base_url, timeout=120)
+        self.client = dc if dc else get_docker_client(base_url)
 
     def run_adcm_container_from_config(self, config: ContainerConfig) -> Tuple[Container, ContainerConfig]:
         """
         Run ADCM container from the docker image.
         Return ADCM container and updated container config.
         """
-        if config.pull:
+        if config.pull and not self._pull_can_be_skipped(config):
             self.client.images.pull(config.image, config.tag)
         if os.environ.get("BUILD_TAG"):
             config.labels.update({"jenkins-job": os.environ["BUILD_TAG"]})
@@ -380,13 +648,14 @@ class DockerWrapper:  # pylint: disable=too-few-public-methods
             ip_end = base_url.rfind(":")
             config.bind_ip = base_url[ip_start:ip_end]
 
-        with allure.step(f"Run ADCM container from {config.image}:{config.tag}"):
+        with allure.step(f"Run ADCM container from {config.full_image}"):
             container, config.bind_port, config.bind_secure_port = (
                 self._run_container(config) if config.bind_port else self._run_container_on_free_port(config)
             )
             config.api_ip, config.api_port, config.api_secure_port = self._get_adcm_ip_and_port(config, container)
             allure.attach(
-                json.dumps(asdict(config), indent=2),  # config object is not serializable
+                # config object is not serializable, asdict() is avoided since it deep-copies nested dicts
+                json.dumps({field.name: getattr(config, field.name) for field in fields(config)}, indent=2),
                 name="Container config",
                 attachment_type=AttachmentType.JSON,
             )
@@ -394,48 +663,81 @@ class DockerWrapper:  # pylint: disable=too-few-public-methods
 
         return container, config
 
-    def _run_container_on_free_port(self, config: ContainerConfig) -> Tuple[Container, int, int]:
-        free_ports = _yield_ports(config.bind_ip)
-        config.bind_port = next(free_ports)
-        if config.https:
-            config.bind_secure_port = next(free_ports)
+    def run_adcm_batch(self, configs: List[ContainerConfig]) -> List[Tuple[Container, ContainerConfig]]:
+        """
+        Run several ADCM containers concurrently, so waiting for their initialization overlaps.
+        Return ADCM containers and updated container configs in the order of given configs.
+        """
+        if not configs:
+            return []
+        with ThreadPoolExecutor(max_workers=min(len(configs), 16)) as executor:
+            return list(executor.map(self.run_adcm_container_from_config, configs))
+
+    def _pull_can_be_skipped(self, config: ContainerConfig) -> bool:
+        """
+        Image pinned by digest can't change, so it isn't pulled again when present locally.
+        Tags may be moved in registry (e.g. rebuilt branch images), so images referenced by tag are pulled
+        unless SKIP_PULL_IF_LOCAL_ENV is set
+        """
+        if not (config.tag or "").startswith("sha256:") and not os.environ.get(SKIP_PULL_IF_LOCAL_ENV):
+            return False
+        return image_exists(config.image, config.tag, self.client)
 
+    def _run_container_on_free_port(self, config: ContainerConfig) -> Tuple[Container, int, int]:
+        # ports that docker refused to bind, they are not offered again even if probe reports them as free
+        refused_ports = set()
         for _ in range(0, CONTAINER_START_RETRY_COUNT):
-            try:
-                return self._run_container(config)
-            except APIError as err:
-                if (
-                    "failed: port is already allocated" in err.explanation
-                    or "bind: address already in use" in err.explanation  # noqa: W503
-                    or "bind: cannot assign requested address" in err.explanation  # noqa: W503
-                ):
-                    # such error excepting leaves created container and there is
-                    # no way to clean it other than from docker library
-                    # try to find next one port
-                    config.bind_port = next(free_ports)
-                    if config.https:
-                        config.bind_secure_port = next(free_ports)
-                else:
-                    raise err
+            # docker reserves published port only on start, so ports are probed, and container is created and started
+            # under the lock shared by threads of the process and by processes of the user (e.g. xdist workers).
+            # Lock is held for a single attempt, ports are re-probed each time as they could be taken in between
+            with _PORT_ALLOCATION_LOCK, file_lock(PORT_ALLOCATION_LOCK_FILE):
+                free_ports = (port for port in _yield_ports(config.bind_ip) if port not in refused_ports)
+                config.bind_port = next(free_ports)
+                if config.https:
+                    config.bind_secure_port = next(free_ports)
+                container_id = self._create_container(config)
+                try:
+                    return self._start_container(container_id, config)
+                except APIError as err:
+                    if (
+                        "failed: port is already allocated" not in err.explanation
+                        and "bind: address already in use" not in err.explanation  # noqa: W503
+                        and "bind: cannot assign requested address" not in err.explanation  # noqa: W503
+                    ):
+                        raise err
+                    # auto remove works only for started containers, so created one is removed explicitly
+                    self.client.api.remove_container(container_id, force=True)
+                    refused_ports.update((config.bind_port, config.bind_secure_port))
         raise RetryCountExceeded(f"Unable to start container after {CONTAINER_START_RETRY_COUNT} retries")
 
     def _run_container(self, config: ContainerConfig) -> (Container, int):
+        return self._start_container(self._create_container(config), config)
+
+    def _create_container(self, config: ContainerConfig) -> str:
         ports = {"8000": (config.bind_ip, config.bind_port)}
         if config.bind_secure_port:
             ports["8443"] = (config.bind_ip, config.bind_secure_port)
-        return (
-            self.client.containers.run(
-                config.full_image,
-                ports=ports,
-                volumes=config.volumes,
-                remove=config.remove,
-                labels=config.labels,
-                name=config.name,
-                detach=True,
-            ),
-            config.bind_port,
-            config.bind_secure_port,
+        # low-level API is used to create and start container separately (container that failed to start
+        # is removed by its id), high-level `containers.run` also inspects the container before it's started
+        host_config = self.client.api.create_host_config(
+            port_bindings=ports, binds=config.volumes, auto_remove=config.remove
         )
+        return self.client.api.create_container(
+            config.full_image,
+            ports=list(ports),
+            volumes=[volume["bind"] for volume in config.volumes.values()] if config.volumes else None,
+            host_config=host_config,
+            labels=config.labels,
+            name=config.name,
+            detach=True,
+        )["Id"]
+
+    def _start_container(self, container_id: str, config: ContainerConfig) -> Tuple[Container, int, int]:
+        self.client.api.start(container_id)
+        # the single inspect call after start, its result is kept in container.attrs for later consumers
+        # (network settings for API address, mounts for volumes cleanup, auto remove flag for stop)
+        container = self.client.containers.get(container_id)
+        return container, config.bind_port, config.bind_secure_port
 
     def _get_adcm_ip_and_port(self, config: ContainerConfig, container) -> Tuple[str, str, str]:
         # If test runner is running in docker then 127.0.0.1
@@ -443,7 +745,7 @@ class DockerWrapper:  # pylint: disable=too-few-public-methods
         # so we need to establish ADCM API connection using internal docker network
         api_ip, api_port, api_secure_port = config.bind_ip, config.bind_port, config.bind_secure_port
         if config.bind_ip == DEFAULT_IP and is_docker():
-            api_ip = self.client.api.inspect_container(container.id)["NetworkSettings"]["IPAddress"]
+            api_ip = container.attrs["NetworkSettings"]["IPAddress"]
             api_port = "8000"
             api_secure_port = "8443"
         return api_ip, api_port, api_secure_port
@@ -491,11 +793,10 @@ class ADCM:
     def stop(self):
         """Stop ADCM container"""
         self.container.stop()
+        # container is started with auto remove exactly when config says so
         if self.container_config.remove:
-            with suppress(NotFound):
-                condition = "removed" if self.container.attrs["HostConfig"]["AutoRemove"] else "stopped"
-                with suppress_docker_wait_error():
-                    self.container.wait(condition=condition, timeout=30)
+            with suppress(NotFound), suppress_docker_wait_error():
+                self.container.wait(condition="removed", timeout=30)
 
     @allure.step("Remove ADCM container")
     def remove(self):
@@ -512,8 +813,10 @@ class ADCM:
         ), "There is no volume to move data. Make sure you are using the correct ADCM fixture for upgrade"
         volume_name = list(self.container_config.volumes.keys()).pop()
         volume = self.container_config.volumes.get(volume_name)
-        with allure.step("Copy /adcm/data to the folder attached by volume"):
-            self.container.exec_run(f"sh -c 'cp -a /adcm/data/* {volume['bind']}'")
+        if volume["bind"] != "/adcm/data":
+            with allure.step("Copy /adcm/data to the folder attached by volume"):
+                # "/." copies directory content including hidden files without spawning a shell for glob expansion
+                self.container.exec_run(["cp", "-a", "/adcm/data/.", volume["bind"]])
         with allure.step("Update ADCM container config"):
             self.container_config.image = image
             self.container_config.tag = tag
@@ -529,6 +832,7 @@ class ADCM:
 def remove_docker_image(repo: str, tag: str, dc: DockerClient):
     """Remove docker image"""
     image_name = f"{repo}:{tag}"
+    invalidate_image_exists_cache(repo, tag)
     for container in dc.containers.list(filters=dict(ancestor=image_name)):
         with suppress_docker_wait_error():
             container.wait(condition="removed", timeout=30)
@@ -543,9 +847,17 @@ def remove_docker_image(repo: str, tag: str, dc: DockerClient):
 def remove_container_volumes(container: Container, dc: DockerClient):
     """Remove volumes related to the given container.
     Note that container should be removed before function call."""
-    for name in [mount["Name"] for mount in container.attrs["Mounts"] if mount["Type"] == "volume"]:
-        with suppress(NotFound):  # volume may be removed already
-            dc.volumes.get(name).remove()
+    names = [mount["Name"] for mount in container.attrs["Mounts"] if mount["Type"] == "volume"]
+    if not names:
+        return
+    with ThreadPoolExecutor(max_workers=min(8, len(names))) as executor:
+        # list() is required to re-raise errors from the workers
+        list(executor.map(lambda name: _remove_volume(name, dc), names))
+
+
+def _remove_volume(name: str, dc: DockerClient):
+    with suppress(NotFound):  # volume may be removed already
+        dc.volumes.get(name).remove()
 
 
 @contextmanager
@@ -569,20 +881,57 @@ def is_file_presented_in_directory(container: Container, file: str, directory: s
     return file in container.exec_run(["ls", "-a", directory]).output.decode("utf-8")
 
 
-def copy_file_to_container(from_container: Container, to_container: Container, from_path: str, to_path: str) -> None:
+def batch_script(*commands: str) -> str:
     """
-    Copy file from one container to another through local temp directory in /tmp
+    Join shell commands into one script that prints separator line after output of each command
+
+    >>> batch_script("ls -a /adcm/data", "cat /adcm/data/file")
+    "ls -a /adcm/data; echo '===ADCM-SEP==='; cat /adcm/data/file"
     """
-    local_tempdir = f"{from_container.name}-to-{to_container.name}-{random_string(6)}"
-    _run_command_and_assert_result(
-        f"docker cp {from_container.name}:{from_path} /tmp/{local_tempdir}",
-        "Copy from container to filesystem failed.",
-    )
-    _run_command_and_assert_result(
-        f"docker cp /tmp/{local_tempdir} {to_container.name}:{to_path}", "Copy to container failed."
-    )
+    return f"; echo '{BATCH_EXEC_SEPARATOR}'; ".join(commands)
+
 
+def split_batch_output(output: str) -> List[str]:
+    """
+    Split output of script built with `batch_script` into outputs of separate commands
+
+    >>> split_batch_output("file\\ndir\\n===ADCM-SEP===\\ncontent\\n")
+    ['file\\ndir\\n', 'content\\n']
+    """
+    return output.split(f"{BATCH_EXEC_SEPARATOR}\n")
+
+
+def copy_file_to_container(from_container: Container, to_container: Container, from_path: str, to_path: str) -> None:
+    """
+    Copy file from one container to another with Docker archive API.
+    File is saved in target container as `to_path`
+    """
+    stream, _ = from_container.get_archive(from_path)
+    target_dir, target_name = os.path.split(to_path.rstrip("/"))
+    archive = io.BytesIO()
+    # source archive is read while chunks arrive, each member is written to the target one right away
+    with tarfile.open(mode="r|", fileobj=_ChunkReader(stream), bufsize=_COPY_BUFFER_SIZE) as source, tarfile.open(
+        mode="w", fileobj=archive
+    ) as target:
+        for member in source:
+            content = source.extractfile(member) if member.isfile() else None
+            # archive root is named after the source path, so it is renamed to the target one
+            member.name = _rename_archive_root(member.name, target_name)
+            if member.islnk():
+                # hard link points to another member of the archive
+                member.linkname = _rename_archive_root(member.linkname, target_name)
+            target.addfile(member, content)
+    to_container.put_archive(target_dir or "/", archive.getvalue())
+
+
+def _rename_archive_root(path: str, root: str) -> str:
+    """
+    Replace the first component of path inside archive
 
-def _run_command_and_assert_result(command: str, fail_message: str):
-    """Run `os.system` with given command and assert that result code is equal to 0"""
-    assert (result := os.system(command)) == 0, f"Operation failed. Exit code was {result}. Message: {fail_message}"
+    >>> _rename_archive_root("source", "target")
+    'target'
+    >>> _rename_archive_root("source/dir/file", "target")
+    'target/dir/file'
+    """
+    _, _, subpath = path.partition("/")
+    return f"{root}/{subpath}" if subpath else root
@@ -10,14 +10,17 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 """Fixtures of ADCM image and ADCM client"""
+import hashlib
+import json
+import os
 import socket
 import time
 import uuid
 from contextlib import suppress
-from typing import Generator
+from pathlib import Path
+from typing import Generator, Optional
 
 import allure
-import docker
 import ifaddr
 import pytest
 from _pytest.fixtures import SubRequest
@@ -35,11 +38,13 @@ from .docker_utils import (
     ContainerConfig,
     DockerWrapper,
     gather_adcm_data_from_container,
+    get_docker_client,
+    image_exists,
     is_docker,
     remove_container_volumes,
     remove_docker_image,
 )
-from .utils import allure_reporter, check_mutually_exclusive
+from .utils import allure_reporter, check_mutually_exclusive, file_lock
 
 DATADIR = utils.get_data_dir(__file__)
 
@@ -99,15 +104,24 @@ def bind_container_ip(cmd_opts):
     return ip
 
 
-# pylint: disable=redefined-outer-name, too-many-arguments
+# pylint: disable=redefined-outer-name, too-many-arguments, too-many-locals
 @allure.title("ADCM Image")
 @pytest.fixture(scope="session")
-def image(request, cmd_opts, bind_container_ip, adcm_api_credentials, additional_adcm_init_config, adcm_https):
+def image(
+    request,
+    cmd_opts,
+    bind_container_ip,
+    adcm_api_credentials,
+    additional_adcm_init_config,
+    adcm_https,
+    tmp_path_factory,
+):
     """That fixture creates ADCM container, waits until
     a database becomes initialised and stores that as images
     with random tag and name local/adcminit
     That can be useful to use that fixture to make ADCM's
     container startup time shorter.
+    When running with xdist the image is initialized once and shared between workers.
     Operates with cmd-opts:
      '--staticimage INIT_IMAGE'
      '--adcm-image IMAGE'
@@ -128,10 +142,7 @@ def image(request, cmd_opts, bind_container_ip, adcm_api_credentials, additional
         if check_mutually_exclusive(cmd_opts, *opt_sets):
             raise Exception(f"wrong using of import parameters {', '.join(opt_sets)} are mutually exclusive")
 
-    if cmd_opts.remote_docker:
-        docker_client = docker.DockerClient(base_url=f"tcp://{cmd_opts.remote_docker}", timeout=120)
-    else:
-        docker_client = docker.from_env(timeout=120)
+    docker_client = get_docker_client(f"tcp://{cmd_opts.remote_docker}" if cmd_opts.remote_docker else None)
 
     params = {}
     if cmd_opts.staticimage:
@@ -161,7 +172,18 @@ def image(request, cmd_opts, bind_container_ip, adcm_api_credentials, additional
         **params,
         **additional_adcm_init_config,
     )
-    init_image = initializer.get_initialized_adcm_image()
+    # https images are not shared since each initializer has to set up its own certificates
+    shared_image_file = None
+    if os.environ.get("PYTEST_XDIST_WORKER") and not cmd_opts.staticimage and not adcm_https:
+        image_key = json.dumps(
+            [container_config.full_image, bind_container_ip, additional_adcm_init_config], default=str
+        ).encode("utf-8")
+        # parent of worker's basetemp is shared between all workers of the run
+        shared_dir = tmp_path_factory.getbasetemp().parent
+        shared_image_file = shared_dir / f"adcm_image_{hashlib.sha1(image_key).hexdigest()}.json"
+        init_image = _acquire_shared_image(initializer, shared_image_file)
+    else:
+        init_image = initializer.get_initialized_adcm_image()
 
     yield init_image["repo"], init_image["tag"]
 
@@ -170,9 +192,44 @@ def image(request, cmd_opts, bind_container_ip, adcm_api_credentials, additional
     if cmd_opts.dontstop or cmd_opts.staticimage:
         return  # leave image intact
 
+    if shared_image_file:
+        init_image = _release_shared_image(shared_image_file)
+        if not init_image:
+            return  # image is still used by other workers
+
     remove_docker_image(**init_image, dc=docker_client)
 
 
+def _acquire_shared_image(initializer: ADCMInitializer, shared_image_file: Path) -> dict:
+    """
+    Get initialized ADCM image shared between xdist workers.
+    The first worker initializes the image, the others reuse it.
+    """
+    with file_lock(f"{shared_image_file}.lock"):
+        shared_image = json.loads(shared_image_file.read_text(encoding="utf-8")) if shared_image_file.exists() else None
+        if shared_image and image_exists(shared_image["repo"], shared_image["tag"], initializer.dc):
+            shared_image["users"] += 1
+        else:
+            shared_image = {**initializer.get_initialized_adcm_image(), "users": 1}
+        shared_image_file.write_text(json.dumps(shared_image), encoding="utf-8")
+    return {"repo": shared_image["repo"], "tag": shared_image["tag"]}
+
+
+def _release_shared_image(shared_image_file: Path) -> Optional[dict]:
+    """
+    Release initialized ADCM image shared between xdist workers.
+    Return image only when it is not used by any worker anymore.
+    """
+    with file_lock(f"{shared_image_file}.lock"):
+        shared_image = json.loads(shared_image_file.read_text(encoding="utf-8"))
+        shared_image["users"] -= 1
+        if shared_image["users"] > 0:
+            shared_image_file.write_text(json.dumps(shared_image), encoding="utf-8")
+            return None
+        shared_image_file.unlink()
+    return {"repo": shared_image["repo"], "tag": shared_image["tag"]}
+
+
 def _adcm(image, request, bind_container_ip, upgradable=False, https=False) -> Generator[ADCM, None, None]:
     repo, tag = image
     cmd_opts = request.config.option
@@ -189,7 +246,9 @@ def _adcm(image, request, bind_container_ip, upgradable=False, https=False) -> G
     volumes = {}
     if upgradable:
         volume_name = str(uuid.uuid4())[-12:]
-        volumes.update({volume_name: {"bind": "/adcm/shadow", "mode": "rw"}})
+        # named volume mounted over /adcm/data is populated from the image by Docker,
+        # so upgrade can reattach it to the new container without copying the data
+        volumes.update({volume_name: {"bind": "/adcm/data", "mode": "rw"}})
     adcm = ADCM(
         docker_wrapper=docker_wrapper,
         container_config=ContainerConfig(
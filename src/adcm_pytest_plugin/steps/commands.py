@@ -13,19 +13,28 @@
 """Execute ADCM Django commands"""
 
 import os.path
-import subprocess
-from contextlib import contextmanager
-from typing import Collection, Generator, List, Literal, Optional, Tuple
+import socket
+from typing import Collection, Dict, List, Literal, Optional, Tuple
 
 import allure
 import requests
+from docker.utils.socket import STDERR, STDOUT, frames_iter
+from requests.adapters import HTTPAdapter
 from version_utils import rpm
 
-from adcm_pytest_plugin.docker_utils import ADCM, is_file_presented_in_directory
+from adcm_pytest_plugin.docker_utils import ADCM, batch_script, split_batch_output
 
 _DEFAULT_VENV = "/adcm/venv/default/bin/activate"
 _MANAGE_PY = "/adcm/python/manage.py"
 
+# keep-alive connections to ADCM API are reused between commands
+_SESSION = requests.Session()
+_SESSION.mount("http://", HTTPAdapter(pool_maxsize=16))
+_SESSION.mount("https://", HTTPAdapter(pool_maxsize=16))
+
+# ADCM version can't change during container lifetime, so prefixes are cached by container id
+_COMMAND_PREFIXES: Dict[str, Tuple[str, str]] = {}
+
 
 @allure.step('Run ADCM command "dumpcluster" on cluster {cluster_id} to file {file_path}')
 def dump_cluster(adcm: ADCM, cluster_id: int, file_path: str, password: str) -> None:
@@ -33,12 +42,17 @@ def dump_cluster(adcm: ADCM, cluster_id: int, file_path: str, password: str) ->
     Dump cluster with "dumpcluster" command.
     """
     command = "dumpcluster"
-    _, python = _get_command_prefixes(adcm)
-    arguments = _prepare_cmd_arguments(adcm, f"{python} {_MANAGE_PY} {command} -c {cluster_id} -o {file_path}")
+    prefixes = _get_command_prefixes(adcm)
     dump_dir, dump_file = os.path.dirname(file_path), os.path.basename(file_path)
-    with _run_in_subprocess(arguments) as process:
-        stdout, stderr = _type_password(process, password)
-    if file_path in stdout and is_file_presented_in_directory(adcm.container, dump_file, dump_dir):
+    # dump directory is listed within the same exec to check that the file was written
+    output, stderr = _run_interactive_command(
+        adcm,
+        batch_script(f"{prefixes[1]} {_MANAGE_PY} {command} -c {cluster_id} -o {file_path}", f"ls -a {dump_dir}"),
+        password,
+        prefixes,
+    )
+    stdout, *listing = split_batch_output(output)
+    if file_path in stdout and listing and dump_file in listing[0].split("\n"):
         return
     _interactive_command_failed(command, stdout, stderr)
 
@@ -49,10 +63,10 @@ def load_cluster(adcm: ADCM, file_path: str, password: str) -> None:
     Load cluster with "loadcluster" command.
     """
     command = "loadcluster"
-    _, python = _get_command_prefixes(adcm)
-    arguments = _prepare_cmd_arguments(adcm, f"{python} {_MANAGE_PY} {command} {file_path}")
-    with _run_in_subprocess(arguments) as process:
-        stdout, stderr = _type_password(process, password)
+    prefixes = _get_command_prefixes(adcm)
+    stdout, stderr = _run_interactive_command(
+        adcm, f"{prefixes[1]} {_MANAGE_PY} {command} {file_path}", password, prefixes
+    )
     if "Load successfully ended" in stdout:
         return
     _interactive_command_failed(command, stdout, stderr)
@@ -80,75 +94,102 @@ def clearaudit(adcm: ADCM) -> None:
     _run_command(adcm, "clearaudit")
 
 
-def _run_command(adcm: ADCM, command: str, options: Optional[Collection[str]] = ()):
+def batched_run(adcm: ADCM, commands: Collection[Tuple[str, Collection[str]]]) -> None:
+    """
+    Run several ADCM commands with a single `docker exec`.
+    Commands are chained with "&&", so the batch stops on the first failed command.
+
+    Example:
+        batched_run(adcm, [("logrotate", ["--target all"]), ("clearaudit", ())])
+    """
     activate_venv, python = _get_command_prefixes(adcm)
-    with allure.step(f'Run ADCM command "{command}"' + (f" with options {' '.join(options)}" if options else "")):
+    command_names = ", ".join(command for command, _ in commands)
+    with allure.step(f'Run ADCM commands "{command_names}"'):
         exit_code, output = _run_with_docker_exec(
             adcm,
             [
                 "sh",
                 "-c",
-                f"{activate_venv} {_DEFAULT_VENV} && {python} {_MANAGE_PY} "
-                f"{command} {' '.join(options) if options else ''}",
+                " && ".join(
+                    [
+                        f"{activate_venv} {_DEFAULT_VENV}",
+                        *(_manage_py_call(python, command, " ".join(options)) for command, options in commands),
+                    ]
+                ),
             ],
         )
+        if exit_code == 0:
+            return
+        _docker_exec_command_failed(command_names, exit_code, output)
+
+
+def _run_command(adcm: ADCM, command: str, options: Optional[Collection[str]] = ()):
+    activate_venv, python = _get_command_prefixes(adcm)
+    options_str = " ".join(options) if options else ""
+    with allure.step(f'Run ADCM command "{command}"' + (f" with options {options_str}" if options_str else "")):
+        exit_code, output = _run_with_docker_exec(
+            adcm,
+            ["sh", "-c", f"{activate_venv} {_DEFAULT_VENV} && {_manage_py_call(python, command, options_str)}"],
+        )
         if exit_code == 0:
             return
         _docker_exec_command_failed(command, exit_code, output)
 
 
-def _run_with_docker_exec(adcm: ADCM, args: List[str]) -> Tuple[int, bytes]:
+def _manage_py_call(python: str, command: str, options_str: str = "") -> str:
     """
-    Execute command given in arguments with `exec_run`
+    Build shell call of ADCM command
+
+    >>> _manage_py_call("python", "logrotate", "--target all --disable-logs")
+    'python /adcm/python/manage.py logrotate --target all --disable-logs'
+    >>> _manage_py_call("python3", "clearaudit")
+    'python3 /adcm/python/manage.py clearaudit '
     """
-    return adcm.container.exec_run(args)
+    return f"{python} {_MANAGE_PY} {command} {options_str}"
 
 
-def _prepare_cmd_arguments(adcm: ADCM, command: str) -> List[str]:
+def _run_with_docker_exec(adcm: ADCM, args: List[str]) -> Tuple[int, bytes]:
     """
-    Prepare "args" required to execute interactive ADCM command from terminal
+    Execute command given in arguments with `exec_run`
     """
-    activate_venv, _ = _get_command_prefixes(adcm)
-    return [
-        "docker",
-        "exec",
-        "-i",
-        adcm.container.name,
-        "sh",
-        "-c",
-        f"{activate_venv} {_DEFAULT_VENV} && {command}",
-    ]
+    return adcm.container.exec_run(args)
 
 
-@contextmanager
-def _run_in_subprocess(args: List[str]) -> Generator[subprocess.Popen, None, None]:
+def _run_interactive_command(
+    adcm: ADCM, command: str, input_data: str, prefixes: Optional[Tuple[str, str]] = None
+) -> Tuple[str, str]:
     """
-    Start subprocess to communicate with
+    Execute interactive ADCM command via `docker exec` API, type `input_data` to its stdin
+    and return stdout and stderr decoded from bytes.
+    Prefixes are requested from ADCM when they aren't passed.
+    Only unix socket and plain tcp docker transports are supported:
+    stdin is closed with socket half-close, which TLS connection doesn't provide
     """
-    process = subprocess.Popen(
-        args,
-        stdin=subprocess.PIPE,
-        stdout=subprocess.PIPE,
-        stderr=subprocess.PIPE,
-    )
+    activate_venv, _ = prefixes or _get_command_prefixes(adcm)
+    api = adcm.container.client.api
+    exec_id = api.exec_create(
+        adcm.container.id, ["sh", "-c", f"{activate_venv} {_DEFAULT_VENV} && {command}"], stdin=True
+    )["Id"]
+    exec_socket = api.exec_start(exec_id, socket=True)
     try:
-        yield process
+        # docker-py returns SocketIO wrapper for unix and plain tcp transports, stdin is closed via underlying socket
+        raw_socket = exec_socket._sock  # pylint: disable=protected-access
+        raw_socket.sendall(input_data.encode("utf-8"))
+        # close stdin of the command the same way as `docker exec -i` does on EOF
+        raw_socket.shutdown(socket.SHUT_WR)
+        # output is accumulated in place, frames of big dumps are not re-concatenated into new bytes objects
+        output = {STDOUT: bytearray(), STDERR: bytearray()}
+        for stream, frame in frames_iter(exec_socket, tty=False):
+            output[stream] += frame
     finally:
-        process.terminate()
-
-
-def _type_password(process: subprocess.Popen, password: str) -> Tuple[str, str]:
-    """
-    Type password and return stdout and stderr decoded from bytes
-    """
-    stdout, stderr = process.communicate(password.encode("utf-8"))
-    return stdout.decode("utf-8"), stderr.decode("utf-8")
+        exec_socket.close()
+    return output[STDOUT].decode("utf-8", "replace"), output[STDERR].decode("utf-8", "replace")
 
 
 def _interactive_command_failed(command: str, stdout_log: str, stderr_log: str):
     """
     Attach logs of command and raise AssertionError
-    when interactive command execution (ran with Popen) failed
+    when interactive command execution (ran with `docker exec` API) failed
     """
     allure.attach(stdout_log, name="stdout", attachment_type=allure.attachment_type.TEXT)
     allure.attach(stderr_log, name="stderr", attachment_type=allure.attachment_type.TEXT)
@@ -168,12 +209,16 @@ def _docker_exec_command_failed(command: str, exit_code: int, output: bytes):
 
 def _get_command_prefixes(adcm: ADCM) -> Tuple[str, str]:
     """Get venv activation and python prefixes"""
-    if rpm.compare_versions(_get_adcm_version(adcm), "2022.10.04.17") > 0:
-        return ".", "python"
-    return "source", "python3"
+    container_id = adcm.container.id
+    if container_id not in _COMMAND_PREFIXES:
+        if rpm.compare_versions(_get_adcm_version(adcm), "2022.10.04.17") > 0:
+            _COMMAND_PREFIXES[container_id] = ".", "python"
+        else:
+            _COMMAND_PREFIXES[container_id] = "source", "python3"
+    return _COMMAND_PREFIXES[container_id]
 
 
 def _get_adcm_version(adcm: ADCM) -> str:
-    response = requests.get(f"{adcm.url}/api/v1/info/")
+    response = _SESSION.get(f"{adcm.url}/api/v1/info/", timeout=5)
     response.raise_for_status()
     return response.json()["adcm_version"]
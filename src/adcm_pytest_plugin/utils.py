@@ -12,14 +12,19 @@
 """Some utils of plugin"""
 
 
+import fcntl
+import ipaddress
 import os
 import random
 import re
 import string
-from contextlib import AbstractContextManager
+import subprocess
+from contextlib import AbstractContextManager, contextmanager
+from datetime import datetime, timedelta, timezone
 from inspect import getfullargspec
+from pathlib import Path
 from time import sleep, time
-from typing import Callable, Iterable, List, Optional, Tuple, Type, Union
+from typing import Callable, Generator, Iterable, List, Optional, Tuple, Type, Union
 
 import allure
 import pytest
@@ -31,6 +36,16 @@ from allure_commons.reporter import AllureReporter
 from allure_pytest.listener import AllureListener
 from decorator import decorator
 
+try:
+    from cryptography import x509
+    from cryptography.hazmat.primitives import hashes, serialization
+    from cryptography.hazmat.primitives.asymmetric import rsa
+    from cryptography.x509.oid import NameOID
+except ImportError:
+    x509 = None
+
+_CERT_ORGANIZATION = "Arenadata Software LLC"
+
 
 def remove_host(host: Host) -> Task:
     """
@@ -460,16 +475,121 @@ def expectparam(type_: Type) -> Callable:
     return impl
 
 
-def allure_reporter(config) -> Optional[AllureReporter]:
-    """Get Allure Reporter from pytest plugins"""
-    listener: AllureListener = next(
-        filter(
-            lambda plugin: (isinstance(plugin, AllureListener)),
-            dict(config.pluginmanager.list_name_plugin()).values(),
-        ),
-        None,
+@contextmanager
+def file_lock(path: Union[str, os.PathLike]) -> Generator[None, None, None]:
+    """
+    Exclusive lock shared between processes (e.g. xdist workers) via the given lock file
+
+    >>> from tempfile import TemporaryDirectory
+    >>> with TemporaryDirectory() as tmpdir, file_lock(os.path.join(tmpdir, "test.lock")):
+    ...     print("locked")
+    locked
+    """
+    with open(path, "a", encoding="utf-8") as file:
+        fcntl.flock(file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(file, fcntl.LOCK_UN)
+
+
+def generate_self_signed_cert(directory: str, ip: str) -> None:
+    """
+    Write self-signed certificate for ADCM to cert.pem and its private key to key.pem in the given directory.
+    Certificate is generated in-process if `cryptography` is installed and by `openssl` CLI otherwise
+    """
+    try:
+        bind_address = ipaddress.ip_address(ip)
+    except ValueError:
+        # bind address is a hostname, e.g. of remote docker daemon
+        bind_address = None
+    if x509 is None:
+        subject = f"/C=RU/ST=Moscow/L=Moscow/O={_CERT_ORGANIZATION}/OU=Release/CN=ADCM"
+        # no shell is involved, so arguments need no quoting
+        subprocess.run(
+            [
+                "openssl",
+                "req",
+                "-x509",
+                "-newkey",
+                "rsa:4096",
+                "-nodes",
+                "-days",
+                "365",
+                "-subj",
+                subject,
+                "-keyout",
+                os.path.join(directory, "key.pem"),
+                "-out",
+                os.path.join(directory, "cert.pem"),
+                "-addext",
+                f"subjectAltName=DNS:localhost,IP:127.0.0.1,{'IP' if bind_address is not None else 'DNS'}:{ip}",
+            ],
+            check=True,
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.PIPE,
+        )
+        return
+    key = rsa.generate_private_key(public_exponent=65537, key_size=4096)
+    name = x509.Name(
+        [
+            x509.NameAttribute(NameOID.COUNTRY_NAME, "RU"),
+            x509.NameAttribute(NameOID.STATE_OR_PROVINCE_NAME, "Moscow"),
+            x509.NameAttribute(NameOID.LOCALITY_NAME, "Moscow"),
+            x509.NameAttribute(NameOID.ORGANIZATION_NAME, _CERT_ORGANIZATION),
+            x509.NameAttribute(NameOID.ORGANIZATIONAL_UNIT_NAME, "Release"),
+            x509.NameAttribute(NameOID.COMMON_NAME, "ADCM"),
+        ]
+    )
+    now = datetime.now(timezone.utc)
+    # extensions are the same as "openssl req -x509" adds with its default config
+    cert = (
+        x509.CertificateBuilder()
+        .subject_name(name)
+        .issuer_name(name)
+        .public_key(key.public_key())
+        .serial_number(x509.random_serial_number())
+        .not_valid_before(now)
+        .not_valid_after(now + timedelta(days=365))
+        .add_extension(
+            x509.SubjectAlternativeName(
+                [
+                    x509.DNSName("localhost"),
+                    x509.IPAddress(ipaddress.ip_address("127.0.0.1")),
+                    x509.IPAddress(bind_address) if bind_address is not None else x509.DNSName(ip),
+                ]
+            ),
+            critical=False,
+        )
+        .add_extension(x509.BasicConstraints(ca=True, path_length=None), critical=True)
+        .add_extension(x509.SubjectKeyIdentifier.from_public_key(key.public_key()), critical=False)
+        .add_extension(x509.AuthorityKeyIdentifier.from_issuer_public_key(key.public_key()), critical=False)
+        .sign(key, hashes.SHA256())
+    )
+    Path(directory, "cert.pem").write_bytes(cert.public_bytes(serialization.Encoding.PEM))
+    Path(directory, "key.pem").write_bytes(
+        key.private_bytes(serialization.Encoding.PEM, serialization.PrivateFormat.PKCS8, serialization.NoEncryption())
     )
-    return listener.allure_logger if listener else None
+
+
+_ALLURE_REPORTER_KEY = pytest.StashKey[Optional[AllureReporter]]()
+
+
+def allure_reporter(config) -> Optional[AllureReporter]:
+    """
+    Get Allure Reporter from pytest plugins.
+    Plugins are looked up once per session, the result is kept in config stash
+    """
+    if _ALLURE_REPORTER_KEY not in config.stash:
+        listener: AllureListener = next(
+            filter(
+                lambda plugin: (isinstance(plugin, AllureListener)),
+                dict(config.pluginmanager.list_name_plugin()).values(),
+            ),
+            None,
+        )
+        config.stash[_ALLURE_REPORTER_KEY] = listener.allure_logger if listener else None
+    return config.stash[_ALLURE_REPORTER_KEY]
 
 
 def func_name_to_title(func_name):
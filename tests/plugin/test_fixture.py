@@ -22,6 +22,7 @@ import docker
 import pytest
 from requests.exceptions import ReadTimeout as DockerReadTimeout
 from adcm_pytest_plugin.docker_utils import suppress_docker_wait_error
+from adcm_pytest_plugin.fixtures import _acquire_shared_image, _release_shared_image
 
 from tests.plugin.common import run_tests
 
@@ -138,7 +139,7 @@ def test_upgradable_adcm_flag(testdir):
     def test_adcm_is_upgradable(adcm_fs: ADCM):
         assert len(adcm_fs.container_config.volumes) > 0
         for volume in adcm_fs.container_config.volumes.values():
-            if volume["bind"] == "/adcm/shadow":
+            if volume["bind"] == "/adcm/data":
                 break
         else:
             raise AssertionError("Volume for upgrade wasn't found")
@@ -156,13 +157,62 @@ def test_upgradable_adcm_flag_change_one_test(testdir):
     def test_adcm_is_upgradable(adcm_fs: ADCM):
         assert len(adcm_fs.container_config.volumes) > 0
         for volume in adcm_fs.container_config.volumes.values():
-            if volume["bind"] == "/adcm/shadow":
+            if volume["bind"] == "/adcm/data":
                 break
         else:
             raise AssertionError("Volume for upgrade wasn't found")
 
     def test_adcm_is_upgradable_fail(adcm_fs: ADCM):
         for volume in adcm_fs.container_config.volumes.values():
-            assert volume["bind"] != "/adcm/shadow"
+            assert volume["bind"] != "/adcm/data"
     """
     run_tests(testdir, makepyfile_str=test_content, outcomes=dict(passed=2))
+
+
+def test_adcm_batch_gets_distinct_ports(testdir):
+    """Test that ADCM containers started concurrently in one process are bound to different ports"""
+    test_content = """
+    from adcm_pytest_plugin.docker_utils import ContainerConfig, DockerWrapper
+
+    def test_adcm_batch(image):
+        repo, tag = image
+        started = DockerWrapper().run_adcm_batch([ContainerConfig(image=repo, tag=tag, pull=False) for _ in range(2)])
+        try:
+            ports = {config.bind_port for _, config in started}
+            assert len(ports) == 2, f"Containers are bound to the same port: {ports}"
+        finally:
+            for container, _ in started:
+                container.remove(force=True)
+    """
+    run_tests(testdir, makepyfile_str=test_content)
+
+
+class _FakeInitializer:  # pylint: disable=too-few-public-methods
+    """Initializer that counts initialized images instead of building them"""
+
+    dc = None
+
+    def __init__(self):
+        self.initialized = 0
+
+    def get_initialized_adcm_image(self) -> dict:
+        """Pretend to initialize an image"""
+        self.initialized += 1
+        return {"repo": "local/adcm", "tag": f"init-{self.initialized}"}
+
+
+def test_shared_image_reference_counting(tmp_path, monkeypatch):
+    """Test that image shared between xdist workers is initialized once and returned for removal by the last user"""
+    monkeypatch.setattr("adcm_pytest_plugin.fixtures.image_exists", lambda repo, tag, dc: True)
+    initializer = _FakeInitializer()
+    shared_image_file = tmp_path / "adcm_image.json"
+    image = {"repo": "local/adcm", "tag": "init-1"}
+
+    assert _acquire_shared_image(initializer, shared_image_file) == image
+    assert _acquire_shared_image(initializer, shared_image_file) == image
+    assert initializer.initialized == 1, "Shared image should be initialized only by the first worker"
+
+    assert _release_shared_image(shared_image_file) is None
+    assert shared_image_file.exists(), "Shared image file should be kept while image is used"
+    assert _release_shared_image(shared_image_file) == image
+    assert not shared_image_file.exists(), "Shared image file should be removed by the last user"
@@ -20,6 +20,7 @@ import pytest
 from adcm_pytest_plugin.exceptions.bundles import BundleError
 from adcm_pytest_plugin.exceptions.infrastructure import InfrastructureProblem
 from adcm_pytest_plugin.steps.actions import run_cluster_action_and_assert_result
+from adcm_pytest_plugin.steps.commands import dump_cluster, load_cluster
 from adcm_pytest_plugin.utils import get_data_dir
 from adcm_pytest_plugin.plugin import options
 
@@ -79,3 +80,16 @@ def test_verbose_actions_option_with_custom_verbose(sdk_client_fs, bundle_dir):
     options.verbose_actions = True
     run_cluster_action_and_assert_result(cluster=cluster, action="simple_action", verbose=False)
     assert "verbosity: 4" not in sdk_client_fs.job_list()[0].log_list()[0].content
+
+
+@pytest.mark.parametrize("bundle_dir", ["simple_action_cluster"])
+def test_dump_and_load_cluster(sdk_client_fs, adcm_fs, bundle_dir):
+    """Dump cluster with "dumpcluster" command, remove it and restore with "loadcluster" command"""
+    bundle_dir_full = get_data_dir(__file__, bundle_dir)
+    bundle = sdk_client_fs.upload_from_fs(bundle_dir_full)
+    cluster = bundle.cluster_create("test_cluster")
+    file_path, password = "/adcm/data/cluster_dump.json", "dump_password"
+    dump_cluster(adcm_fs, cluster.id, file_path, password)
+    cluster.delete()
+    load_cluster(adcm_fs, file_path, password)
+    assert sdk_client_fs.cluster(name="test_cluster"), "Cluster wasn't restored from dump"